@@ -1,11 +1,17 @@
 """MCP Client using OpenAI models and tools."""
 import asyncio
-import json
+import hashlib
 import logging
+import os
+import threading
+import time
 import sys
 import pathlib as _pathlib
-from contextlib import AsyncExitStack
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+import httpx
+import orjson
 from dotenv import load_dotenv
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
@@ -15,7 +21,7 @@ from openai import AsyncAzureOpenAI
 # FastAPI for HTTP endpoint so Azure Bot Service can call the client
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 
 LOG = logging.getLogger("client_openai")
 
@@ -25,6 +31,140 @@ load_dotenv()
 # (Bot Framework integration removed) The app provides a simple SPA and /message endpoint.
 
 
+# Answers to repeated queries are reused for this many seconds (0 disables)
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "1800"))
+# Answers built from tool results are reused only briefly: the tasks can be
+# changed by other clients that this process never hears about
+TOOL_RESPONSE_CACHE_TTL = float(os.getenv("TOOL_RESPONSE_CACHE_TTL", "5"))
+RESPONSE_CACHE_SIZE = 256
+MCP_SERVER_URL = "https://acr-001-ddb.kindmushroom-70aeff41.westeurope.azurecontainerapps.io/mcp"
+# Seconds the MCP connection has to answer its health-check ping
+MCP_PING_TIMEOUT = float(os.getenv("MCP_PING_TIMEOUT", "5"))
+# query hash -> (answer, expiry), oldest first; shared by every MCPClient so
+# a state change through one client invalidates answers cached by all
+_RESPONSES: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+# Bumped whenever _RESPONSES is cleared, so answers started before a state
+# change are not cached after it
+_RESPONSES_GENERATION = 0
+
+# Fixed first message: together with the sorted tool list it keeps the prompt
+# prefix byte-identical across calls, so Azure OpenAI can reuse its prompt cache.
+STABLE_SYSTEM_PROMPT = (
+    "You are TaskPilot, an assistant that manages the user's tasks. "
+    "Use the available tools to read or change tasks, and answer concisely."
+)
+
+_OPENAI_CLIENT: Optional[AsyncAzureOpenAI] = None
+# Retries of a failed OpenAI request (429, 5xx, timeouts, connection errors)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "5"))
+# Completion requests being sent at once across the process, to stay inside
+# the rate limit. A slot covers sending the request and its retries, not
+# reading the streamed response.
+_OAI_SEM = asyncio.Semaphore(int(os.getenv("OPENAI_MAX_CONCURRENCY", "20")))
+
+
+def _invalidate_responses() -> None:
+    """Drop every cached answer, including those still being generated."""
+    global _RESPONSES_GENERATION
+    _RESPONSES_GENERATION += 1
+    _RESPONSES.clear()
+
+
+def _tool_result_text(result: Any) -> str:
+    """Render an MCP tool result as the content of a tool message.
+
+    Structured output is sent whole. Otherwise all text items are joined:
+    FastMCP returns one item per element of a list result, and none at all
+    for an empty list.
+    """
+    structured = getattr(result, "structuredContent", None)
+    if structured is not None:
+        return orjson.dumps(structured).decode()
+    return "\n".join(item.text for item in result.content if getattr(item, "text", None) is not None)
+
+
+def _log_prompt_cache(response: Any) -> None:
+    """Log how many prompt tokens were served from OpenAI's prompt cache."""
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None)
+    if cached is not None:
+        LOG.debug("Prompt tokens: %d (cached: %d)", usage.prompt_tokens, cached)
+
+
+def get_openai_client() -> AsyncAzureOpenAI:
+    """Return the process-wide Azure OpenAI client.
+
+    Sharing one client keeps its HTTP/2 connections (and their TLS sessions)
+    alive across MCPClient instances instead of rebuilding the pool per request.
+    """
+    global _OPENAI_CLIENT
+    if _OPENAI_CLIENT is None:
+        # NOTE: construction of AsyncAzureOpenAI depends on environment
+        # (API keys and endpoints). We rely on the library to pick up
+        # env vars.
+        _OPENAI_CLIENT = AsyncAzureOpenAI(
+            api_version="2024-12-01-preview",
+            # The SDK backs off exponentially with jitter and honours Retry-After
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_keepalive_connections=50, max_connections=100),
+                timeout=httpx.Timeout(60.0, connect=5.0),
+                http2=True,
+            ),
+        )
+    return _OPENAI_CLIENT
+
+
+async def close_openai_client() -> None:
+    """Close the shared Azure OpenAI client and its connection pool."""
+    global _OPENAI_CLIENT
+    if _OPENAI_CLIENT is not None:
+        await _OPENAI_CLIENT.close()
+        _OPENAI_CLIENT = None
+
+
+async def _ainput(prompt: str) -> str:
+    """Like input(), without blocking the event loop.
+
+    The line is read from the stdin file descriptor on a daemon thread.
+    asyncio.to_thread would not do: on Ctrl-C, asyncio.run waits for its
+    executor threads, so one stuck in input() keeps the process alive until
+    Enter is pressed. sys.stdin is not read from the thread either, since
+    its buffer lock would still be held when the interpreter shuts down.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def settle(result: Optional[str], error: Optional[BaseException]) -> None:
+        if future.done():  # the awaiting task was cancelled
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def read() -> None:
+        # One byte at a time so nothing past the newline is consumed
+        line = bytearray()
+        while not line.endswith(b"\n"):
+            byte = os.read(sys.stdin.fileno(), 1)
+            if not byte:
+                break
+            line += byte
+        if line:
+            result, error = line.decode(errors="replace").rstrip("\r\n"), None
+        else:
+            result, error = None, EOFError("EOF when reading a line")
+        try:
+            loop.call_soon_threadsafe(settle, result, error)
+        except RuntimeError:
+            pass  # the loop has already been closed
+
+    print(prompt, end="", flush=True)
+    threading.Thread(target=read, name="chat-input", daemon=True).start()
+    return await future
+
 class MCPClient:
     """Client for interacting with OpenAI models using MCP tools."""
 
@@ -37,13 +177,14 @@ class MCPClient:
         # Initialize session and client objects
         self.session: Optional[ClientSession] = None
         self.exit_stack = AsyncExitStack()
-        # NOTE: construction of AsyncAzureOpenAI depends on environment
-        # (API keys and endpoints). We rely on the library to pick up
-        # env vars, but we still create a client instance to use.
-        self.openai_client = AsyncAzureOpenAI(api_version="2024-12-01-preview")
+        self.openai_client = get_openai_client()
         self.model = model
         self.stdio: Optional[Any] = None
         self.write: Optional[Any] = None
+        # OpenAI-format tool list, fetched once per connection
+        self._tools_cache: Optional[List[Dict[str, Any]]] = None
+        # Tools the server marks read-only; any other tool changes state
+        self._read_only_tools: Set[str] = set()
 
     async def connect_to_server(self, server_script_path: str = "task_pilot_server.py", server_url: str = "http://localhost:8080/mcp"):
         """Connect to an MCP server using StreamableHTTP."""
@@ -80,33 +221,54 @@ class MCPClient:
             # Ensure we close any partially-opened resources
             try:
                 await self.exit_stack.aclose()
-            except Exception as e:
-                print("Error closing resources:", e)
+            except Exception as close_error:
+                print("Error closing resources:", close_error)
+            # The session is gone; don't go on to use it
+            raise
 
-        # List available tools
-        tools_result = await self.session.list_tools()
+        # List available tools (and cache them for every query)
+        tools = await self.refresh_tools()
         print("\nConnected to server with tools:")
-        for tool in tools_result.tools:
-            print(f"  - {tool.name}: {tool.description}")
+        for tool in tools:
+            print(f"  - {tool['function']['name']}: {tool['function']['description']}")
 
     async def get_mcp_tools(self) -> List[Dict[str, Any]]:
         """Obtain MCP server tools in the OpenAI format.
 
+        The server's tool set is fixed for the life of a connection, so the
+        list is fetched once and reused; see refresh_tools().
+
+        Returns:
+            A list of tools in OpenAI format.
+        """
+        if self._tools_cache is None:
+            await self.refresh_tools()
+        return self._tools_cache
+
+    async def refresh_tools(self) -> List[Dict[str, Any]]:
+        """Re-query the server's tools and rebuild the cached OpenAI list.
+
         Returns:
             A list of tools in OpenAI format.
         """
         tools_result = await self.session.list_tools()
-        return [
+        # Sorted tools and key-sorted schemas give a stable prompt prefix
+        self._tools_cache = [
             {
                 "type": "function",
                 "function": {
                     "name": tool.name,
                     "description": tool.description,
-                    "parameters": tool.inputSchema,
+                    "parameters": orjson.loads(orjson.dumps(tool.inputSchema, option=orjson.OPT_SORT_KEYS)),
                 },
             }
-            for tool in tools_result.tools
+            for tool in sorted(tools_result.tools, key=lambda t: t.name)
         ]
+        self._read_only_tools = {
+            tool.name for tool in tools_result.tools
+            if tool.annotations and tool.annotations.readOnlyHint
+        }
+        return self._tools_cache
 
     async def process_query(self, query: str) -> str:
         """Process a query using OpenAI and available MCP tools.
@@ -117,60 +279,170 @@ class MCPClient:
         Returns:
             The response from OpenAI.
         """
-        # Get available tools
-        tools = await self.get_mcp_tools()
+        return "".join([text async for text in self.stream_query(query)])
 
-        # Initial OpenAI API call
-        response = await self.openai_client.chat.completions.create(
-            model=self.model,
-            messages=[{"role": "user", "content": query}],
-            tools=tools,
-            tool_choice="auto",
-        )
+    async def stream_query(self, query: str) -> AsyncIterator[str]:
+        """Answer a query, yielding the response text as it is generated.
 
-        # Get assistant's response
-        assistant_message = response.choices[0].message
+        Identical queries are answered from a short-lived cache; answers
+        that used tools expire after TOOL_RESPONSE_CACHE_TTL. Answers that
+        called a state-changing tool are not cached and clear the cache,
+        since earlier answers may now be stale.
 
-        # Initialize conversation with user query and assistant response
-        messages = [
+        Args:
+            query: The user query.
+
+        Yields:
+            Fragments of the response text.
+        """
+        key = hashlib.sha256(f"{self.model}\0{query}".encode()).hexdigest()
+        cached = _RESPONSES.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            _RESPONSES.move_to_end(key)
+            yield cached[0]
+            return
+
+        generation = _RESPONSES_GENERATION
+        parts: List[str] = []
+        tools_used: Set[str] = set()
+        try:
+            async for text in self._stream_answer(query, tools_used):
+                parts.append(text)
+                yield text
+        finally:
+            # Tools may have run even if the answer was cut short
+            changed_state = bool(tools_used - self._read_only_tools)
+            if changed_state:
+                _invalidate_responses()
+        ttl = TOOL_RESPONSE_CACHE_TTL if tools_used else RESPONSE_CACHE_TTL
+        if not changed_state and generation == _RESPONSES_GENERATION and ttl > 0:
+            _RESPONSES[key] = ("".join(parts), time.monotonic() + ttl)
+            _RESPONSES.move_to_end(key)
+            while len(_RESPONSES) > RESPONSE_CACHE_SIZE:
+                _RESPONSES.popitem(last=False)
+
+    async def _stream_completion(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: List[Dict[str, Any]],
+        tool_choice: str,
+        calls: Dict[int, Dict[str, str]],
+    ) -> AsyncIterator[str]:
+        """Stream one chat completion, yielding its text deltas.
+
+        Tool-call fragments are accumulated into ``calls`` by index.
+        """
+        async with _OAI_SEM:
+            stream = await self.openai_client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                tools=tools,
+                tool_choice=tool_choice,
+                stream=True,
+                stream_options={"include_usage": True},
+            )
+        async for chunk in stream:
+            # Usage arrives in a final chunk without choices
+            if chunk.usage is not None:
+                _log_prompt_cache(chunk)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                yield delta.content
+            for tc in delta.tool_calls or ():
+                call = calls.setdefault(tc.index, {"id": "", "name": "", "arguments": ""})
+                if tc.id:
+                    call["id"] = tc.id
+                if tc.function is not None:
+                    call["name"] += tc.function.name or ""
+                    call["arguments"] += tc.function.arguments or ""
+
+    async def _stream_answer(self, query: str, tools_used: Set[str]) -> AsyncIterator[str]:
+        """Run a query through OpenAI and MCP, yielding the response text.
+
+        The names of the tools called are added to ``tools_used``.
+        """
+        # Get available tools
+        tools = await self.get_mcp_tools()
+
+        # Static content first, the user query last
+        messages: List[Dict[str, Any]] = [
+            {"role": "system", "content": STABLE_SYSTEM_PROMPT},
             {"role": "user", "content": query},
-            assistant_message,
         ]
 
-        # Handle tool calls if present
-        if assistant_message.tool_calls:
-            # Process each tool call
-            for tool_call in assistant_message.tool_calls:
-                # Execute tool call
-                result = await self.session.call_tool(
-                    tool_call.function.name,
-                    arguments=json.loads(tool_call.function.arguments),
-                )
-
-                # Add tool response to conversation
-                messages.append(
+        # Initial OpenAI API call
+        calls: Dict[int, Dict[str, str]] = {}
+        content: List[str] = []
+        async for text in self._stream_completion(messages, tools, "auto", calls):
+            content.append(text)
+            yield text
+
+        # No tool calls, the direct response has been streamed
+        if not calls:
+            return
+
+        tool_calls = [calls[i] for i in sorted(calls)]
+        # Continue the conversation with the assistant response
+        messages.append(
+            {
+                "role": "assistant",
+                "content": "".join(content) or None,
+                "tool_calls": [
                     {
-                        "role": "tool",
-                        "tool_call_id": tool_call.id,
-                        "content": result.content[0].text,
+                        "id": call["id"],
+                        "type": "function",
+                        "function": {"name": call["name"], "arguments": call["arguments"]},
                     }
-                )
-
-            # Get final response from OpenAI with tool results
-            final_response = await self.openai_client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                tools=tools,
-                tool_choice="none",  # Don't allow more tool calls
+                    for call in tool_calls
+                ],
+            }
+        )
+        # Parse all arguments up front so the dispatch below is pure I/O;
+        # malformed arguments fail only their own call
+        arguments: List[Any] = []
+        for call in tool_calls:
+            try:
+                arguments.append(orjson.loads(call["arguments"] or "{}"))
+            except orjson.JSONDecodeError as e:
+                arguments.append(ValueError(f"invalid arguments for {call['name']}: {e}"))
+
+        # Execute the tool calls concurrently; results keep the call order
+        tools_used.update(call["name"] for call in tool_calls)
+        outcomes = iter(await asyncio.gather(
+            *(
+                self.session.call_tool(call["name"], arguments=args)
+                for call, args in zip(tool_calls, arguments)
+                if not isinstance(args, Exception)
+            ),
+            return_exceptions=True,
+        ))
+        results = [args if isinstance(args, Exception) else next(outcomes) for args in arguments]
+
+        # Add tool responses to conversation; a failed call reports its error
+        for call, result in zip(tool_calls, results):
+            if isinstance(result, Exception):
+                tool_content = f"Error: {result}"
+            else:
+                tool_content = _tool_result_text(result)
+            messages.append(
+                {
+                    "role": "tool",
+                    "tool_call_id": call["id"],
+                    "content": tool_content,
+                }
             )
-            return final_response.choices[0].message.content
 
-        # No tool calls, just return the direct response
-        return assistant_message.content
+        # Stream the final response with the tool results
+        async for text in self._stream_completion(messages, tools, "none", {}):
+            yield text
 
     async def cleanup(self):
         """Clean up resources."""
         await self.exit_stack.aclose()
+        # The cached tools belong to the closed connection
+        self._tools_cache = None
 
     async def chat_loop(self):
         """Run an interactive chat loop"""
@@ -179,7 +451,7 @@ class MCPClient:
 
         while True:
             try:
-                query = input("\nQuery: ").strip()
+                query = (await _ainput("\nQuery: ")).strip()
 
                 if query.lower() == 'quit':
                     break
@@ -187,10 +459,104 @@ class MCPClient:
                 response = await self.process_query(query)
                 print("\n" + response)
 
+            except EOFError:
+                break
             except Exception as e:
                 print(f"\nError: {str(e)}")
 
-app = FastAPI()
+class MCPConnection:
+    """One MCPClient shared by every /message request, kept connected.
+
+    The client is health-checked with a ping before use and replaced by a
+    fresh one if the ping fails or times out, so a restarted MCP server does
+    not break every later request. If connecting fails the connection stays
+    empty and the next use tries again.
+    """
+
+    def __init__(self, server_url: str = MCP_SERVER_URL):
+        self._server_url = server_url
+        self._client: Optional[MCPClient] = None
+        self._owner: Optional[Tuple[asyncio.Task, asyncio.Event]] = None
+        self._replace_lock = asyncio.Lock()
+
+    async def _connect(self) -> MCPClient:
+        """Connect a client inside its own owner task.
+
+        The transport must be closed by the task that opened it, so the
+        owner task keeps the connection open until asked to close it.
+        """
+        ready: asyncio.Future = asyncio.get_running_loop().create_future()
+        stop = asyncio.Event()
+
+        async def own():
+            client = MCPClient()
+            try:
+                await client.connect_to_server(server_url=self._server_url)
+            except Exception as e:
+                await client.cleanup()
+                ready.set_exception(e)
+                return
+            ready.set_result(client)
+            try:
+                await stop.wait()
+            finally:
+                await client.cleanup()
+
+        task = asyncio.create_task(own())
+        client = await ready
+        self._owner = (task, stop)
+        return client
+
+    async def close(self):
+        """Close the current client, if any."""
+        self._client = None
+        owner, self._owner = self._owner, None
+        if owner is None:
+            return
+        task, stop = owner
+        stop.set()
+        try:
+            await task
+        except Exception as e:
+            LOG.warning("Error closing MCP client: %s", e)
+
+    async def acquire(self) -> MCPClient:
+        """Return a healthy client, reconnecting if needed."""
+        client = self._client
+        if client is not None:
+            try:
+                await asyncio.wait_for(client.session.send_ping(), MCP_PING_TIMEOUT)
+                return client
+            except Exception as e:
+                LOG.warning("Replacing unhealthy MCP connection: %s", e)
+        async with self._replace_lock:
+            # Another request may have reconnected already
+            if self._client is client:
+                await self.close()
+                try:
+                    self._client = await self._connect()
+                except Exception as e:
+                    raise RuntimeError("Could not connect to the MCP server") from e
+        return self._client
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect to the MCP server at startup and close the connection on shutdown."""
+    connection = MCPConnection()
+    try:
+        try:
+            await connection.acquire()
+        except RuntimeError as e:
+            # Serve anyway; the first /message retries the connection
+            LOG.warning("MCP server unavailable at startup: %s", e.__cause__)
+        app.state.mcp = connection
+        yield
+    finally:
+        await connection.close()
+        await close_openai_client()
+
+app = FastAPI(lifespan=lifespan)
 # Mount static files (chat SPA)
 app.mount("/static", StaticFiles(directory="./static"), name="static")
 
@@ -202,23 +568,35 @@ async def root_html():
 
 @app.post("/message")
 async def receive_message(req: Request):
-    """Endpoint to receive messages from an Azure Bot or other HTTP client."""
+    """Endpoint to receive messages from an Azure Bot or other HTTP client.
+
+    Replies with JSON, or streams server-sent events when the client
+    accepts text/event-stream.
+    """
     payload = await req.json()
     text = payload.get("text") if isinstance(payload, dict) else None
     if not text:
         return {"error": "missing text"}
 
-    # For simplicity, create a temporary MCPClient and connect to local server
-    client = MCPClient()
+    # The session is shared; MCP requests on it are multiplexed by id
     try:
-        mcp_url = "https://acr-001-ddb.kindmushroom-70aeff41.westeurope.azurecontainerapps.io"
-        if mcp_url and not mcp_url.startswith("/mcp"):
-            mcp_url = mcp_url.rstrip("/") + "/mcp"
-        await client.connect_to_server(server_url=mcp_url)
+        client = await req.app.state.mcp.acquire()
+    except RuntimeError as e:
+        return {"error": str(e)}
+    if "text/event-stream" not in req.headers.get("accept", ""):
         resp = await client.process_query(text)
         return {"reply": resp}
-    finally:
-        await client.cleanup()
+    return StreamingResponse(_sse_reply(client, text), media_type="text/event-stream")
+
+async def _sse_reply(client: MCPClient, text: str) -> AsyncIterator[str]:
+    """Stream the answer as server-sent events, ending with a "done" event."""
+    try:
+        async for delta in client.stream_query(text):
+            yield f"data: {orjson.dumps({'delta': delta}).decode()}\n\n"
+    except Exception as e:
+        LOG.exception("Streaming reply failed")
+        yield f"event: error\ndata: {orjson.dumps({'error': str(e)}).decode()}\n\n"
+    yield "event: done\ndata: {}\n\n"
 
 async def main():
     """Main function to run the MCP client"""
@@ -232,6 +610,7 @@ async def main():
         await client.chat_loop()
     finally:
         await client.cleanup()
+        await close_openai_client()
 
 if __name__ == "__main__":
     asyncio.run(main())
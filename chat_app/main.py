@@ -1,11 +1,36 @@
 """Main entry point to start the MCP server."""
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from task_pilot_server import mcp
+from task_pilot_server import mcp, shutdown
 import uvicorn
 
 app = FastAPI()
 
 app = mcp.streamable_http_app()
+_serve_mcp = app.router.lifespan_context
+
+@asynccontextmanager
+async def lifespan(app):
+    """Run the MCP session manager, then flush and close the task store."""
+    try:
+        async with _serve_mcp(app):
+            yield
+    finally:
+        await shutdown()
+
+app.router.lifespan_context = lifespan
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    # Each worker holds its own in-memory STORE, so keep a single worker
+    # unless the store is shared across processes (STORE_BACKEND=redis).
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=8080,
+        loop="uvloop",
+        http="httptools",
+        workers=int(os.environ.get("WEB_CONCURRENCY", "1")),
+        log_level="warning",
+        access_log=False,
+    )
\ No newline at end of file
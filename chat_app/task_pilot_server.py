@@ -1,79 +1,582 @@
 """Server-side task management with MCP."""
-import time
+import asyncio
+import atexit
+import gzip
+import io
 import logging
 import os
-import json
+import random
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from uuid import uuid4
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Protocol
+import aiohttp
+import orjson
 from dotenv import load_dotenv
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 from mcp.server.fastmcp import FastMCP, Context
-from azure.storage.blob import BlobClient
+from mcp.types import ToolAnnotations
+from openai import AsyncAzureOpenAI
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob import ContentSettings
+from azure.storage.blob.aio import BlobClient
 
 LOG = logging.getLogger("task_pilot")
 
 load_dotenv()
 
+def _use_uvloop() -> None:
+    """Run new event loops on uvloop (Linux only, when it is installed)."""
+    if not sys.platform.startswith("linux"):
+        return
+    try:
+        import uvloop
+    except ImportError:
+        return
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+_use_uvloop()
+
 AZURE_STORAGE_CONNECTION_STRING = os.environ.get("AZURE_STORAGE_CONNECTION_STRING")
 AZURE_STORAGE_CONTAINER = os.environ.get("AZURE_STORAGE_CONTAINER", "tasks")
 AZURE_STORAGE_BLOB_NAME = os.environ.get("AZURE_STORAGE_BLOB_NAME", "tasks.json")
+AZURE_STORAGE_POOL_SIZE = int(os.environ.get("AZURE_STORAGE_POOL_SIZE", "8"))
+# SQLite database used when Azure Storage is not configured
+TASKS_DB = Path(os.environ.get("TASKS_DB", Path(__file__).parent / "tasks.db"))
+MAX_BACKOFF = 10.0
+FLUSH_DEBOUNCE_MS = int(os.environ.get("FLUSH_DEBOUNCE_MS", "200"))
+# How often to pick up blob changes made by other instances (0 disables)
+BLOB_RESYNC_SECONDS = float(os.environ.get("BLOB_RESYNC_SECONDS", "30"))
+# Where tasks are kept: "azure" (blob), "sqlite" (local, the default without
+# Azure Storage), "memory" or "redis"
+STORE_BACKEND = os.environ.get(
+    "STORE_BACKEND", "azure" if AZURE_STORAGE_CONNECTION_STRING else "sqlite").lower()
+REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+if STORE_BACKEND not in ("azure", "sqlite", "memory", "redis"):
+    raise ValueError(f"Unknown STORE_BACKEND: {STORE_BACKEND}")
+if STORE_BACKEND == "azure" and not AZURE_STORAGE_CONNECTION_STRING:
+    raise ValueError("STORE_BACKEND=azure requires AZURE_STORAGE_CONNECTION_STRING")
+# Pretty-print the JSON served by the resources, which people read (e.g. in
+# MCP Inspector). The stored blob is always compact.
+JSON_PRETTY = os.environ.get("TASK_PILOT_JSON_PRETTY", "1").lower() in ("1", "true", "yes")
+_JSON_OPTIONS = orjson.OPT_INDENT_2 if JSON_PRETTY else 0
+# Azure OpenAI deployment used by bulk_status_notes (a Global Batch
+# deployment when use_batch is set)
+STATUS_NOTE_MODEL = os.environ.get("STATUS_NOTE_MODEL", "gpt-4.1")
+BATCH_POLL_SECONDS = 30
+# Status-note completions in flight at once outside of batch mode
+STATUS_NOTE_CONCURRENCY = int(os.environ.get("STATUS_NOTE_CONCURRENCY", "8"))
+
+_BLOB_CLIENT: Optional[BlobClient] = None
+_BLOB_CLIENT_LOCK = threading.Lock()
+# ETag of the blob contents STORE was last loaded from or saved as
+_ETAG: Optional[str] = None
+
+def _create_transport() -> AioHttpTransport:
+    """Build a keep-alive transport with a bounded connection pool.
+
+    Must be called from a running event loop (aiohttp binds its session to it).
+    Like azure-core's own session, it leaves Content-Encoding to the caller.
+    """
+    connector = aiohttp.TCPConnector(limit=AZURE_STORAGE_POOL_SIZE, ttl_dns_cache=300)
+    session = aiohttp.ClientSession(connector=connector, auto_decompress=False)
+    return AioHttpTransport(
+        session=session, session_owner=True,
+        connection_timeout=5, read_timeout=30, connection_data_block_size=64 * 1024)
+
+def _create_blob_client() -> Optional[BlobClient]:
+    """Build a new async BlobClient, or None when Azure Storage is not configured."""
+    if not AZURE_STORAGE_CONNECTION_STRING:
+        return None
+    return BlobClient.from_connection_string(
+        AZURE_STORAGE_CONNECTION_STRING, container_name=AZURE_STORAGE_CONTAINER,
+        blob_name=AZURE_STORAGE_BLOB_NAME, transport=_create_transport())
 
 def get_blob_client():
-    """Return a BlobClient when Azure Storage."""
-    blob_client = None
-    if AZURE_STORAGE_CONNECTION_STRING:
-        blob_client = BlobClient.from_connection_string(
-            AZURE_STORAGE_CONNECTION_STRING, container_name=AZURE_STORAGE_CONTAINER,
-            blob_name=AZURE_STORAGE_BLOB_NAME)
-    return blob_client
-
-def read_blob_with_retry(blob_client: Any, retries: int = 3, backoff: float = 0.5):
-    """Read the task store from Blob Storage with retries."""
+    """Return the shared BlobClient when Azure Storage is configured.
+
+    The client is built once and reused so its HTTP pipeline (and pooled
+    TLS connections) survive across load/save calls.
+    """
+    global _BLOB_CLIENT
+    if _BLOB_CLIENT is None and AZURE_STORAGE_CONNECTION_STRING:
+        with _BLOB_CLIENT_LOCK:
+            if _BLOB_CLIENT is None:
+                _BLOB_CLIENT = _create_blob_client()
+    return _BLOB_CLIENT
+
+def _retry_delay(backoff: float, attempt: int) -> float:
+    """Exponential backoff with jitter, capped at MAX_BACKOFF seconds."""
+    return min(MAX_BACKOFF, backoff * (2 ** (attempt - 1))) * random.uniform(0.5, 1.5)
+
+async def _with_retry(what: str, op, retries: int, backoff: float):
+    """Await ``op()``, retrying failures with backoff; re-raises the last error."""
     for attempt in range(1, retries + 1):
         try:
-            stream = blob_client.download_blob()
-            return json.loads(stream.readall())
+            return await op()
         except Exception as e:
-            LOG.warning("Blob read error (attempt %d/%d): %s", attempt, retries, e)
+            if LOG.isEnabledFor(logging.WARNING):
+                LOG.warning("%s error (attempt %d/%d): %s", what, attempt, retries, e)
             if attempt == retries:
                 raise
-            time.sleep(backoff * attempt)
+            await asyncio.sleep(_retry_delay(backoff, attempt))
 
-def write_blob_with_retry(blob_client: Any, store: Dict[str, dict], retries: int = 3, backoff: float = 0.5):
-    """Write the task store to Blob Storage with retries."""
-    data = json.dumps(store, indent=2).encode("utf-8")
-    for attempt in range(1, retries + 1):
+async def read_blob_with_retry(blob_client: Any, retries: int = 3, backoff: float = 0.5,
+                               etag: Optional[str] = None):
+    """Read the task store from Blob Storage with retries.
+
+    Returns ``(store, etag)``. When ``etag`` is given and the blob has not
+    changed, the body is not downloaded and ``(None, etag)`` is returned.
+    A blob that does not exist yet reads as an empty store.
+    """
+    conditions: Dict[str, Any] = {}
+    if etag:
+        conditions = {"etag": etag, "match_condition": MatchConditions.IfModified}
+
+    async def _read():
         try:
-            blob_client.upload_blob(data, overwrite=True)
-            return
-        except Exception as e:
-            LOG.warning("Blob write error (attempt %d/%d): %s", attempt, retries, e)
-            if attempt == retries:
-                raise
-            time.sleep(backoff * attempt)
+            stream = await blob_client.download_blob(max_concurrency=4, **conditions)
+        except ResourceNotFoundError:
+            return {}, None
+        except HttpResponseError as e:
+            # The blob SDK reports a 304 as ResourceModifiedError (when Azure
+            # sends ConditionNotMet) or as a bare HttpResponseError, never as
+            # ResourceNotModifiedError. Either way it is not a failure to retry.
+            if etag and e.status_code == 304:
+                return None, etag
+            raise
+        # Chunks are written straight into one buffer and parsed from a
+        # view of it, avoiding the extra joined copy readall() makes.
+        buf = io.BytesIO()
+        await stream.readinto(buf)
+        data = buf.getbuffer()
+        encoding = stream.properties.content_settings.content_encoding
+        if encoding == "gzip" and data[:2] == b"\x1f\x8b":
+            data = gzip.decompress(data)
+        return orjson.loads(data), stream.properties.etag
+
+    return await _with_retry("Blob read", _read, retries, backoff)
+
+async def write_blob_with_retry(blob_client: Any, store: Dict[str, dict], retries: int = 3, backoff: float = 0.5):
+    """Write the task store to Blob Storage with retries. Returns the new ETag.
+
+    The JSON is gzipped (level 1: most of the size win for little CPU).
+    """
+    data = gzip.compress(orjson.dumps(store), compresslevel=1)
+    content_settings = ContentSettings(content_type="application/json", content_encoding="gzip")
 
-def load() -> Dict[str, dict]:
-    """Load the task store from Blob Storage. Raises if storage not available."""
-    blob = get_blob_client()
-    return read_blob_with_retry(blob)
+    async def _write():
+        result = await blob_client.upload_blob(
+            data, overwrite=True, content_settings=content_settings)
+        return result.get("etag")
 
-def save(store: Dict[str, dict]) -> None:
+    return await _with_retry("Blob write", _write, retries, backoff)
+
+async def load(blob_client: Any = None) -> Optional[Dict[str, dict]]:
+    """Load the task store from Blob Storage. Raises if storage not available.
+
+    The read is conditional on the ETag of the last load or save, so it
+    returns None, without a download, when the blob has not changed since.
+    """
+    global _ETAG
+    blob = blob_client or get_blob_client()
+    store, _ETAG = await read_blob_with_retry(blob, etag=_ETAG)
+    return store
+
+async def save(store: Dict[str, dict], blob_client: Any = None) -> None:
     """Save the task store to Blob Storage. Raises on failure."""
-    blob = get_blob_client()
-    write_blob_with_retry(blob, store)
+    global _ETAG
+    blob = blob_client or get_blob_client()
+    _ETAG = await write_blob_with_retry(blob, store)
+
+def _load_at_startup() -> Dict[str, dict]:
+    """Load the task store before serving.
+
+    Uses its own short-lived client and event loop on a worker thread, so it
+    works whether or not the importer is already running a loop (as under
+    `uvicorn main:app`), and the shared client stays bound to the server loop.
+    """
+    async def _load() -> Dict[str, dict]:
+        if STORE_BACKEND == "memory":
+            return {}
+        if STORE_BACKEND == "sqlite":
+            backend = SqliteStore(TASKS_DB)
+            try:
+                return await backend.items()
+            finally:
+                backend.close()
+        if STORE_BACKEND == "redis":
+            backend = RedisStore(REDIS_URL)
+            try:
+                return await backend.items()
+            finally:
+                await backend.close()
+        blob = _create_blob_client()
+        try:
+            return await load(blob) or {}
+        finally:
+            if blob is not None:
+                await blob.close()
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(asyncio.run, _load()).result()
+
+# ---------- Store backends ----------
+_WORKER_ID = uuid4().hex
+
+class StoreBackend(Protocol):
+    """Where the task store is shared; STORE is this process's view of it."""
+    async def get(self, task_id: str) -> Optional[dict]: ...
+    async def set(self, task_id: str, task: dict) -> None: ...
+    async def delete(self, task_id: str) -> None: ...
+    async def items(self) -> Dict[str, dict]: ...
+    async def set_many(self, tasks: Dict[str, dict]) -> None: ...
+    async def delete_many(self, task_ids: list[str]) -> None: ...
+
+class InMemoryStore:
+    """Process-local backend: nothing is shared with other workers."""
+
+    def __init__(self, data: Dict[str, dict]):
+        self._data = data
+
+    async def get(self, task_id: str) -> Optional[dict]:
+        return self._data.get(task_id)
+
+    async def set(self, task_id: str, task: dict) -> None:
+        self._data[task_id] = task
+
+    async def delete(self, task_id: str) -> None:
+        self._data.pop(task_id, None)
+
+    async def items(self) -> Dict[str, dict]:
+        return dict(self._data)
+
+    async def set_many(self, tasks: Dict[str, dict]) -> None:
+        self._data.update(tasks)
+
+    async def delete_many(self, task_ids: list[str]) -> None:
+        for task_id in task_ids:
+            self._data.pop(task_id, None)
+
+class SqliteStore:
+    """Local SQLite table with one row per task.
+
+    Each mutation writes only the rows it touches instead of rewriting the
+    whole store. Queries run on a worker thread to keep the loop free.
+    """
+
+    def __init__(self, path: Path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("CREATE TABLE IF NOT EXISTS tasks (id TEXT PRIMARY KEY, data TEXT NOT NULL)")
+
+    def _run(self, sql: str, params: Any = (), many: bool = False) -> list:
+        with self._lock, self._conn:
+            cursor = self._conn.executemany(sql, params) if many else self._conn.execute(sql, params)
+            return cursor.fetchall()
+
+    async def get(self, task_id: str) -> Optional[dict]:
+        rows = await asyncio.to_thread(self._run, "SELECT data FROM tasks WHERE id = ?", (task_id,))
+        return orjson.loads(rows[0][0]) if rows else None
+
+    async def set(self, task_id: str, task: dict) -> None:
+        await self.set_many({task_id: task})
+
+    async def delete(self, task_id: str) -> None:
+        await self.delete_many([task_id])
+
+    async def items(self) -> Dict[str, dict]:
+        rows = await asyncio.to_thread(self._run, "SELECT id, data FROM tasks")
+        return {tid: orjson.loads(data) for tid, data in rows}
+
+    async def set_many(self, tasks: Dict[str, dict]) -> None:
+        rows = [(tid, orjson.dumps(task).decode()) for tid, task in tasks.items()]
+        await asyncio.to_thread(self._run, "INSERT OR REPLACE INTO tasks (id, data) VALUES (?, ?)", rows, True)
+
+    async def delete_many(self, task_ids: list[str]) -> None:
+        rows = [(tid,) for tid in task_ids]
+        await asyncio.to_thread(self._run, "DELETE FROM tasks WHERE id = ?", rows, True)
+
+    def close(self) -> None:
+        self._conn.close()
+
+class RedisStore:
+    """Redis hash shared by all workers (requires the `redis` package).
+
+    Every change is also published on a channel so the other workers can
+    update their local STORE instead of serving stale data.
+    """
+
+    def __init__(self, url: str, key: str = "tasks:all", channel: str = "tasks:events"):
+        import redis.asyncio as redis
+        self._redis = redis.from_url(url)
+        self._key = key
+        self._channel = channel
+
+    async def get(self, task_id: str) -> Optional[dict]:
+        raw = await self._redis.hget(self._key, task_id)
+        return None if raw is None else orjson.loads(raw)
+
+    async def set(self, task_id: str, task: dict) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key, task_id, orjson.dumps(task))
+            pipe.publish(self._channel, self._event(task_id, task))
+            await pipe.execute()
+
+    async def delete(self, task_id: str) -> None:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(self._key, task_id)
+            pipe.publish(self._channel, self._event(task_id, None))
+            await pipe.execute()
+
+    async def items(self) -> Dict[str, dict]:
+        raw = await self._redis.hgetall(self._key)
+        return {k.decode(): orjson.loads(v) for k, v in raw.items()}
+
+    async def set_many(self, tasks: Dict[str, dict]) -> None:
+        if not tasks:
+            return
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key, mapping={tid: orjson.dumps(t) for tid, t in tasks.items()})
+            for tid, task in tasks.items():
+                pipe.publish(self._channel, self._event(tid, task))
+            await pipe.execute()
+
+    async def delete_many(self, task_ids: list[str]) -> None:
+        if not task_ids:
+            return
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.hdel(self._key, *task_ids)
+            for tid in task_ids:
+                pipe.publish(self._channel, self._event(tid, None))
+            await pipe.execute()
+
+    async def subscribe(self) -> Any:
+        """Subscribe to change events; pass the result to `events()`."""
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self._channel)
+        return pubsub
+
+    async def events(self, pubsub: Any):
+        """Yield (task_id, task or None) for changes made by other workers."""
+        async for message in pubsub.listen():
+            if message["type"] != "message":
+                continue
+            event = orjson.loads(message["data"])
+            if event["origin"] != _WORKER_ID:
+                yield event["id"], event["task"]
+
+    async def close(self) -> None:
+        await self._redis.aclose()
+
+    def _event(self, task_id: str, task: Optional[dict]) -> bytes:
+        return orjson.dumps({"origin": _WORKER_ID, "id": task_id, "task": task})
+
+_BACKEND: Optional[StoreBackend] = None
+_FOLLOWER: Optional[asyncio.Task] = None
+
+def get_backend() -> StoreBackend:
+    """Return this process's store backend, creating it on first use."""
+    global _BACKEND
+    if _BACKEND is None:
+        if STORE_BACKEND == "redis":
+            _BACKEND = RedisStore(REDIS_URL)
+        elif STORE_BACKEND == "sqlite":
+            _BACKEND = SqliteStore(TASKS_DB)
+        else:
+            _BACKEND = InMemoryStore(STORE)
+    return _BACKEND
+
+async def _follow_backend(backend: RedisStore) -> None:
+    """Apply changes published by other workers to STORE and its caches."""
+    pubsub = await backend.subscribe()
+    # Reload after subscribing so nothing published since startup is missed.
+    snapshot = await backend.items()
+    for tid in set(STORE) - set(snapshot):
+        _apply_change(tid, None)
+    for tid, task in snapshot.items():
+        _apply_change(tid, task)
+    async for tid, task in backend.events(pubsub):
+        _apply_change(tid, task)
+
+async def _follow_blob() -> None:
+    """Periodically apply blob changes written by other instances.
+
+    Each poll is an ETag-conditional read, so an unchanged blob costs a 304
+    and no download. Polls are skipped while local changes are unsaved: the
+    next flush overwrites the blob with them anyway.
+    """
+    while True:
+        await asyncio.sleep(BLOB_RESYNC_SECONDS)
+        version = _VERSION
+        if version != _SAVED_VERSION:
+            continue
+        try:
+            store = await load()
+        except Exception:
+            LOG.exception("Resync of the task store failed")
+            continue
+        # A mutation made during the read must not be overwritten
+        if store is None or _VERSION != version:
+            continue
+        for tid in set(STORE) - set(store):
+            _apply_change(tid, None)
+        for tid, task in store.items():
+            if STORE.get(tid) != task:
+                _apply_change(tid, task)
+
+def ensure_synced() -> None:
+    """Start following changes made by other workers or instances."""
+    global _FOLLOWER
+    if _FOLLOWER is not None and not _FOLLOWER.done():
+        return
+    if STORE_BACKEND == "redis":
+        _FOLLOWER = asyncio.get_running_loop().create_task(_follow_backend(get_backend()))
+    elif STORE_BACKEND == "azure" and BLOB_RESYNC_SECONDS > 0:
+        _FOLLOWER = asyncio.get_running_loop().create_task(_follow_blob())
+
+def _apply_change(task_id: str, task: Optional[dict]) -> None:
+    """Update STORE and the read caches for one task (None removes it)."""
+    global _ALL_JSON
+    if task is None:
+        STORE.pop(task_id, None)
+        _TASK_CACHE.pop(task_id, None)
+    else:
+        STORE[task_id] = task
+        # Other workers publish Task.model_dump() output, already valid
+        _TASK_CACHE[task_id] = Task.model_construct(**task)
+    _index(task_id, task)
+    _ALL_JSON = None
+
+def _index(task_id: str, task: Optional[dict]) -> None:
+    """File a task id under _OPEN or _DONE (None removes it from both)."""
+    if task is None:
+        _OPEN.pop(task_id, None)
+        _DONE.pop(task_id, None)
+    elif task.get("done"):
+        _OPEN.pop(task_id, None)
+        _DONE.setdefault(task_id)
+    else:
+        _DONE.pop(task_id, None)
+        _OPEN.setdefault(task_id)
+
+# ---------- Background flush ----------
+_DIRTY = asyncio.Event()
+_FLUSHER: Optional[asyncio.Task] = None
+# Bumped on every mutation; the flusher records the version it persisted
+_VERSION = 0
+_SAVED_VERSION = 0
+
+async def _flusher() -> None:
+    """Persist STORE after a short quiet period, coalescing bursts of mutations."""
+    global _SAVED_VERSION
+    failures = 0
+    while True:
+        await _DIRTY.wait()
+        await asyncio.sleep(FLUSH_DEBOUNCE_MS / 1000)
+        # Clear before snapshotting so mutations made during the upload
+        # schedule another flush instead of being lost.
+        _DIRTY.clear()
+        version = _VERSION
+        try:
+            await save(dict(STORE))
+        except Exception:
+            failures += 1
+            LOG.exception("Background flush of the task store failed")
+            # The changes are still unsaved: back off, then try again
+            await asyncio.sleep(_retry_delay(0.5, failures))
+            _DIRTY.set()
+        else:
+            failures = 0
+            _SAVED_VERSION = version
+
+def mark_dirty() -> None:
+    """Record that STORE changed and, for the blob backend, schedule a flush."""
+    global _FLUSHER, _ALL_JSON, _VERSION
+    _ALL_JSON = None
+    if STORE_BACKEND != "azure":
+        return
+    _VERSION += 1
+    if _FLUSHER is None or _FLUSHER.done():
+        _FLUSHER = asyncio.get_running_loop().create_task(_flusher())
+    _DIRTY.set()
+
+@atexit.register
+def _flush_at_exit() -> None:
+    """Write out mutations the background flusher has not persisted yet.
+
+    A fallback for when shutdown() did not run. The server loop has
+    finished by now, so this runs its own loop with a fresh client.
+    """
+    if _VERSION == _SAVED_VERSION:
+        return
+
+    async def _save() -> None:
+        blob = _create_blob_client()
+        try:
+            await save(dict(STORE), blob)
+        finally:
+            await blob.close()
+
+    try:
+        asyncio.run(_save())
+    except Exception:
+        LOG.exception("Final flush of the task store failed")
+
+async def shutdown() -> None:
+    """Flush unsaved changes and close the shared clients.
+
+    Call on the serving loop once it stops taking requests; the atexit
+    flush then has nothing left to do.
+    """
+    global _BLOB_CLIENT, _OPENAI_CLIENT, _SAVED_VERSION
+    for task in (_FLUSHER, _FOLLOWER):
+        if task is not None:
+            task.cancel()
+    if _VERSION != _SAVED_VERSION:
+        version = _VERSION
+        try:
+            await save(dict(STORE))
+        except Exception:
+            LOG.exception("Final flush of the task store failed")
+        else:
+            _SAVED_VERSION = version
+    if _BLOB_CLIENT is not None:
+        await _BLOB_CLIENT.close()
+        _BLOB_CLIENT = None
+    if _OPENAI_CLIENT is not None:
+        await _OPENAI_CLIENT.close()
+        _OPENAI_CLIENT = None
 
 # ---------- Data model ----------
 class Task(BaseModel):
     """A simple task item."""
+    model_config = ConfigDict(
+        extra="ignore", validate_assignment=False,
+        str_strip_whitespace=False, arbitrary_types_allowed=False)
+
     id: str = Field(default_factory=lambda: uuid4().hex)
     title: str
     done: bool = False
     tags: list[str] = []
 
-# Resolve any forward refs (safe even if none exist)
-Task.model_rebuild()
+# Batch validator for stored data (reuses one compiled schema for the list)
+_TASK_LIST = TypeAdapter(list[Task])
+
+STORE: Dict[str, dict] = _load_at_startup()
 
-STORE: Dict[str, dict] = load()
+# Read-side caches, kept in step with STORE by the mutating tools
+_TASK_CACHE: Dict[str, Task] = dict(zip(STORE, _TASK_LIST.validate_python(list(STORE.values()))))
+_ALL_JSON: Optional[str] = None
+# Ids of open and completed tasks; dicts rather than sets to keep STORE order
+_OPEN: Dict[str, None] = dict.fromkeys(tid for tid, t in STORE.items() if not t.get("done"))
+_DONE: Dict[str, None] = dict.fromkeys(tid for tid, t in STORE.items() if t.get("done"))
 
 # ---------- MCP Setup ----------
 mcp = FastMCP("TaskPilot")
@@ -81,60 +584,185 @@ mcp = FastMCP("TaskPilot")
 # ---------- Tools ----------
 @mcp.tool()
 async def add_task(title: str, ctx: Context, tags: Optional[list[str]] = None) -> Task:
-    """Create and persist a new task."""
+    """Create a new task and schedule it to be persisted."""
+    ensure_synced()
     title = (title or "").strip()
     if not title:
         ctx.error("Title cannot be empty.")
         raise ValueError("Title cannot be empty.")
     task = Task(title=title, tags=[t for t in (tags or []) if t.strip()])
-    STORE[task.id] = task.model_dump()
+    entry = task.model_dump()
+    # Write through first so a concurrent resync cannot drop the local copy
+    await get_backend().set(task.id, entry)
+    STORE[task.id] = entry
+    _TASK_CACHE[task.id] = task
+    _OPEN[task.id] = None
+    # Before any await, so a resync cannot drop the unsaved task
+    mark_dirty()
     await ctx.info(f"Created task {task.id}: {task.title}")
-    save(STORE)
     return task
 
 @mcp.tool()
+async def bulk_import(lines: list[str], ctx: Context, tags: Optional[list[str]] = None) -> int:
+    """Create one task per non-empty line. Returns number of tasks created."""
+    ensure_synced()
+    titles = [s for s in (ln.strip() for ln in lines) if s]
+    tags = [t for t in (tags or []) if t.strip()]
+    total = len(titles)
+    # Report progress about every 1% instead of once per line
+    step = max(1, total // 100)
+    new_tasks: Dict[str, dict] = {}
+    for i, title in enumerate(titles, start=1):
+        tid = uuid4().hex
+        new_tasks[tid] = {"id": tid, "title": title, "done": False, "tags": list(tags)}
+        if i % step == 0 or i == total:
+            await ctx.report_progress(i, total)
+    await get_backend().set_many(new_tasks)
+    STORE.update(new_tasks)
+    # Rows are built here from already-clean values, so skip validation
+    _TASK_CACHE.update((tid, Task.model_construct(**t)) for tid, t in new_tasks.items())
+    _OPEN.update(dict.fromkeys(new_tasks))
+    # Before any await, so a resync cannot drop the unsaved tasks
+    mark_dirty()
+    await ctx.info(f"Imported {total} tasks")
+    return total
+
+@mcp.tool(annotations=ToolAnnotations(readOnlyHint=True))
 def list_tasks(include_done: bool = True) -> list[Task]:
     """Return all tasks (filtering by completion)."""
-    tasks = [Task(**t) for t in STORE.values()]
-    if not include_done:
-        tasks = [t for t in tasks if not t.done]
-    return tasks
+    ensure_synced()
+    if include_done:
+        return list(_TASK_CACHE.values())
+    return [_TASK_CACHE[tid] for tid in _OPEN]
 
 @mcp.tool()
-def complete_task(task_id: str) -> Task:
-    """Mark a task completed and save it."""
-    if task_id not in STORE:
+async def complete_task(task_id: str) -> Task:
+    """Mark a task completed and schedule a save."""
+    ensure_synced()
+    entry = STORE.get(task_id)
+    if entry is None:
         raise ValueError(f"Task not found: {task_id}")
-    t = Task(**STORE[task_id])
-    t.done = True
-    STORE[t.id] = t.model_dump()
-    save(STORE)
+    updated = {**entry, "done": True}
+    await get_backend().set(task_id, updated)
+    STORE[task_id] = updated
+    # The entry came from Task.model_dump(), so it needs no re-validation
+    t = Task.model_construct(**updated)
+    _TASK_CACHE[task_id] = t
+    _index(task_id, updated)
+    mark_dirty()
     return t
 
 @mcp.tool()
-def clear_completed() -> int:
+async def clear_completed() -> int:
     """Remove all completed tasks. Returns number removed."""
-    removed = 0
-    for tid in list(STORE.keys()):
-        if STORE[tid].get("done"):
-            del STORE[tid]
-            removed += 1
-    if removed:
-        save(STORE)
-    return removed
+    ensure_synced()
+    done_ids = list(_DONE)
+    if not done_ids:
+        return 0
+    await get_backend().delete_many(done_ids)
+    for tid in done_ids:
+        STORE.pop(tid, None)
+        _TASK_CACHE.pop(tid, None)
+        _DONE.pop(tid, None)
+    mark_dirty()
+    return len(done_ids)
+
+_OPENAI_CLIENT: Optional[AsyncAzureOpenAI] = None
+
+def get_openai_client() -> AsyncAzureOpenAI:
+    """Return the Azure OpenAI client, configured from the AZURE_OPENAI_* env vars."""
+    global _OPENAI_CLIENT
+    if _OPENAI_CLIENT is None:
+        _OPENAI_CLIENT = AsyncAzureOpenAI(api_version="2024-12-01-preview")
+    return _OPENAI_CLIENT
+
+def _note_messages(title: str) -> list[dict]:
+    """The status_note prompt as OpenAI chat messages."""
+    return [{"role": m["role"], "content": m["content"]["text"]} for m in status_note(title)]
+
+async def _batch_status_notes(titles: list[str], ctx: Context) -> list[str]:
+    """Run one status_note request per title as an OpenAI batch job."""
+    client = get_openai_client()
+    requested = sum(map(bool, titles))
+    payload = b"".join(
+        orjson.dumps({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/chat/completions",
+            "body": {"model": STATUS_NOTE_MODEL, "messages": _note_messages(title)},
+        }) + b"\n"
+        for i, title in enumerate(titles) if title
+    )
+    batch_file = await client.files.create(file=("status_notes.jsonl", payload), purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=batch_file.id, endpoint="/chat/completions", completion_window="24h")
+    await ctx.info(f"Submitted batch {batch.id} with {requested} requests")
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        await asyncio.sleep(BATCH_POLL_SECONDS)
+        batch = await client.batches.retrieve(batch.id)
+        counts = batch.request_counts
+        if counts is not None:
+            await ctx.report_progress(counts.completed + counts.failed, requested)
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"Batch {batch.id} ended with status {batch.status}")
+
+    output = await client.files.content(batch.output_file_id)
+    notes = [""] * len(titles)
+    for line in output.content.splitlines():
+        row = orjson.loads(line)
+        response = row.get("response") or {}
+        if response.get("status_code") == 200:
+            notes[int(row["custom_id"])] = response["body"]["choices"][0]["message"]["content"]
+    return notes
+
+@mcp.tool(annotations=ToolAnnotations(readOnlyHint=True))
+async def bulk_status_notes(titles: list[str], ctx: Context, use_batch: bool = False) -> list[str]:
+    """Write a one-line status note for each task title, in the same order.
+
+    With use_batch the notes are generated through the OpenAI Batch API:
+    half the cost and a separate rate limit, but results may take up to
+    24 hours. Blank titles, and titles whose note failed, get an empty note.
+    """
+    titles = [t.strip() for t in titles]
+    if not any(titles):
+        return [""] * len(titles)
+    if use_batch:
+        return await _batch_status_notes(titles, ctx)
+
+    client = get_openai_client()
+    limit = asyncio.Semaphore(STATUS_NOTE_CONCURRENCY)
+
+    async def note(title: str) -> str:
+        if not title:
+            return ""
+        try:
+            async with limit:
+                response = await client.chat.completions.create(
+                    model=STATUS_NOTE_MODEL, messages=_note_messages(title))
+        except Exception as e:
+            LOG.warning("Status note for %r failed: %s", title, e)
+            return ""
+        return response.choices[0].message.content or ""
+
+    return list(await asyncio.gather(*(note(title) for title in titles)))
 
 # ---------- Resources (read-only) ----------
 @mcp.resource("tasks://all")
 def get_all_tasks() -> str:
     """Return the entire task store as JSON."""
-    return json.dumps(STORE, indent=2)
+    global _ALL_JSON
+    ensure_synced()
+    if _ALL_JSON is None:
+        _ALL_JSON = orjson.dumps(STORE, option=_JSON_OPTIONS).decode()
+    return _ALL_JSON
 
 @mcp.resource("task://{task_id}")
 def get_task(task_id: str) -> str:
     """Return a single task as JSON by id."""
+    ensure_synced()
     if task_id not in STORE:
-        return json.dumps({"error": "not found", "id": task_id})
-    return json.dumps(STORE[task_id], indent=2)
+        return orjson.dumps({"error": "not found", "id": task_id}).decode()
+    return orjson.dumps(STORE[task_id], option=_JSON_OPTIONS).decode()
 
 @mcp.prompt(title="Write a status note")
 def status_note(title: str):
@@ -154,5 +782,12 @@ def status_note(title: str):
         },
     ]
 
+async def _serve_stdio() -> None:
+    """Serve over stdio, shutting down cleanly when the client disconnects."""
+    try:
+        await mcp.run_stdio_async()
+    finally:
+        await shutdown()
+
 if __name__ == "__main__":
-    mcp.run()
+    asyncio.run(_serve_stdio())
@@ -2,11 +2,13 @@
 
 import asyncio
 from pprint import pprint
-import json
+
+import orjson
 
 from mcp import ClientSession
 from mcp.client.stdio import stdio_client, StdioServerParameters
 
+_MISSING = object()
 
 def _get_contents(obj):
     """Return the list of content items from an RPC result or resource read.
@@ -16,17 +18,12 @@ def _get_contents(obj):
     """
     if obj is None:
         return []
-    # object with attribute
-    if hasattr(obj, "content"):
-        val = getattr(obj, "content")
-        if val is None:
-            return []
-        return list(val)
-    if hasattr(obj, "contents"):
-        val = getattr(obj, "contents")
-        if val is None:
-            return []
-        return list(val)
+    # object with attribute (one getattr each instead of hasattr + getattr)
+    val = getattr(obj, "content", _MISSING)
+    if val is _MISSING:
+        val = getattr(obj, "contents", _MISSING)
+    if val is not _MISSING:
+        return [] if val is None else list(val)
     # maybe a dict-like mapping
     if isinstance(obj, dict):
         for key in ("content", "contents"):
@@ -38,14 +35,19 @@ def _get_contents(obj):
 
 def _extract_id_from_result(result):
     """Try several heuristics to extract an `id` from a tool result."""
-    for item in _get_contents(result):
-        # item may be an object with .type/.json/.text attributes
-        t = getattr(item, "type", None)
+    items = _get_contents(result)
+    # fast path: the first item is normally the structured result itself
+    if items:
+        j = getattr(items[0], "json", None)
+        if isinstance(j, dict) and "id" in j:
+            return j["id"]
+    for item in items:
+        # item may be an object with .json/.text attributes
         j = getattr(item, "json", None)
         txt = getattr(item, "text", None)
 
-        # structured JSON payload already available
-        if t == "json" and isinstance(j, dict) and "id" in j:
+        # structured JSON payload already available: no parsing needed
+        if isinstance(j, dict) and "id" in j:
             return j.get("id")
 
         # sometimes item itself is a dict
@@ -56,15 +58,11 @@ def _extract_id_from_result(result):
             if "id" in item:
                 return item.get("id")
 
-        # other shapes: json property contains id
-        if isinstance(j, dict) and "id" in j:
-            return j.get("id")
-
         # sometimes the server returns JSON as text; try parsing it
         if isinstance(txt, str):
             try:
-                parsed = json.loads(txt)
-            except json.JSONDecodeError:
+                parsed = orjson.loads(txt)
+            except orjson.JSONDecodeError:
                 parsed = None
             if isinstance(parsed, dict) and "id" in parsed:
                 return parsed.get("id")
@@ -99,8 +97,8 @@ def _pretty_print_result(result, prefix=None):
         if isinstance(txt, str):
             # try parsing JSON text to present structured output instead of raw string
             try:
-                parsed = json.loads(txt)
-            except json.JSONDecodeError:
+                parsed = orjson.loads(txt)
+            except orjson.JSONDecodeError:
                 parsed = None
             if isinstance(parsed, dict):
                 print(f"[{i}] JSON (from text):")